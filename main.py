@@ -9,8 +9,18 @@ KivyMD YouTube Downloader – Fully Fixed Nov 2025
 """
 import os
 import re
+import copy
+import errno
+import json
+import stat
+import shutil
+import tempfile
 import threading
+import importlib
+from concurrent.futures import ThreadPoolExecutor
 import datetime
+import time
+from functools import lru_cache, partial
 from kivy.lang import Builder
 from kivy.clock import Clock, mainthread
 from kivy.metrics import dp
@@ -18,162 +28,146 @@ from kivy.properties import StringProperty, NumericProperty, ListProperty
 from kivy.storage.jsonstore import JsonStore
 from kivy.utils import platform
 from kivymd.app import MDApp
-from kivymd.uix.filemanager import MDFileManager
-from kivymd.uix.dialog import MDDialog
-from kivymd.uix.list import OneLineListItem
 from kivymd.uix.menu import MDDropdownMenu
-import yt_dlp
-
-KV = '''
-BoxLayout:
-    orientation: "vertical"
-    padding: dp(12)
-    spacing: dp(10)
-
-    MDCard:
-        size_hint_y: None
-        height: dp(230)
-        elevation: 6
-        padding: dp(12)
-        radius: [dp(12)]
-
-        BoxLayout:
-            orientation: "vertical"
-            spacing: dp(8)
-
-            MDTextField:
-                id: url_field
-                hint_text: "Paste YouTube URL here"
-                required: True
-
-            BoxLayout:
-                size_hint_y: None
-                height: dp(40)
-                spacing: dp(8)
-
-                MDLabel:
-                    text: "Folder:"
-                    size_hint_x: None
-                    width: dp(60)
-
-                MDLabel:
-                    id: folder_label
-                    text: app.download_folder or "No folder selected"
-                    theme_text_color: "Secondary"
-                    shorten: True
-                    shorten_from: "right"
-
-                MDFillRoundFlatIconButton:
-                    text: "Choose"
-                    icon: "folder-outline"
-                    size_hint_x: None
-                    width: dp(120)
-                    on_release: app.open_file_manager()
-
-            BoxLayout:
-                size_hint_y: None
-                height: dp(48)
-                spacing: dp(8)
-
-                MDRaisedButton:
-                    text: "Load Formats"
-                    on_release: app.load_formats()
-
-                MDFlatButton:
-                    id: quality_btn
-                    text: "Quality"
-                    disabled: True
-                    size_hint_x: 0.3
-
-                MDRaisedButton:
-                    text: "Download"
-                    on_release: app.start_download()
-
-                MDFlatButton:
-                    text: "Clear"
-                    on_release: app.clear_inputs()
-
-    MDCard:
-        size_hint_y: None
-        height: dp(60)
-        elevation: 4
-        padding: dp(12), dp(8)
-
-        MDBoxLayout:
-            orientation: "horizontal"
-            adaptive_height: True
-            spacing: dp(10)
-
-            MDProgressBar:
-                id: progress
-                value: app.progress
-
-            MDLabel:
-                id: percent_label
-                text: "0 %"
-                halign: "center"
-                size_hint_x: None
-                width: dp(60)
-
-    MDCard:
-        size_hint_y: None
-        height: dp(120)
-        elevation: 4
-        padding: dp(12)
-
-        BoxLayout:
-            orientation: "vertical"
-            MDLabel:
-                text: "Status"
-                font_style: "Subtitle1"
-            MDLabel:
-                id: status_label
-                text: app.status_text
-                theme_text_color: "Secondary"
-
-    MDCard:
-        size_hint_y: None
-        height: dp(200)
-        elevation: 4
-        padding: dp(12)
-
-        BoxLayout:
-            orientation: "vertical"
-            MDLabel:
-                text: "Recent Downloads"
-                font_style: "Subtitle1"
-            ScrollView:
-                MDList:
-                    id: recent_list
-'''
+
+IS_ANDROID = platform == 'android'
+HAS_FFMPEG = shutil.which("ffmpeg") is not None
+PRIMARY_STORAGE = "/storage/emulated/0"
+# Buffer size for moving video data into SAF documents by hand
+COPY_BUFSIZE = 4 * 1024 * 1024
+
+if IS_ANDROID:
+    # Resolved once at import: every autoclass() call is a JNI class lookup
+    # plus reflection over all of the class's methods
+    import fcntl  # POSIX-only; Windows desktop has no fcntl module
+    from jnius import autoclass
+    from android import activity as android_activity
+    from android.runnable import run_on_ui_thread
+    Intent = autoclass('android.content.Intent')
+    Uri = autoclass('android.net.Uri')
+    DocumentsContract = autoclass('android.provider.DocumentsContract')
+    PythonActivity = autoclass('org.kivy.android.PythonActivity')
+
+    @lru_cache(maxsize=None)
+    def content_resolver():
+        """The activity's ContentResolver, fetched over JNI only once."""
+        return PythonActivity.mActivity.getContentResolver()
+
+    PICK_FOLDER_REQUEST = 1001
+    PICK_FOLDER_FLAGS = (Intent.FLAG_GRANT_PERSISTABLE_URI_PERMISSION |
+                         Intent.FLAG_GRANT_READ_URI_PERMISSION |
+                         Intent.FLAG_GRANT_WRITE_URI_PERMISSION)
+
+    @run_on_ui_thread
+    def start_folder_picker():
+        intent = Intent(Intent.ACTION_OPEN_DOCUMENT_TREE)
+        intent.addFlags(PICK_FOLDER_FLAGS)
+        PythonActivity.mActivity.startActivityForResult(intent, PICK_FOLDER_REQUEST)
+
+# Layout lives next to this file (buildozer packages *.kv)
+KV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "youtubedl.kv")
+
+_SHORTS_RE = re.compile(r"youtube\.com/shorts/([A-Za-z0-9_-]{11})")
+# Cheap sanity check so typos are rejected before any thread or network I/O
+_YT_URL_RE = re.compile(
+    r"(?:https?://)?(?:(?:www|m|music)\.)?"
+    r"(?:youtube\.com/(?:watch\?(?:\S*&)?v=|shorts/|embed/|live/)|youtu\.be/)"
+    r"[A-Za-z0-9_-]{11}"
+)
+# MIME types for the containers yt-dlp hands us; createDocument needs one
+_MIME_TYPES = {
+    "mp4": "video/mp4",
+    "webm": "video/webm",
+    "3gp": "video/3gpp",
+    "mkv": "video/x-matroska",
+}
+# Characters not allowed in SAF display names, mapped to "_"
+_UNSAFE_CHARS = str.maketrans(dict.fromkeys('<>:"/\\|?*', "_"))
+
 
 def fix_shorts_url(url: str) -> str:
-    m = re.search(r"youtube\.com/shorts/([A-Za-z0-9_-]{11})", url)
+    if "/shorts/" not in url:
+        return url
+    m = _SHORTS_RE.search(url)
     if m:
         return f"https://www.youtube.com/watch?v={m.group(1)}"
     return url
 
 
+def _permission_denied(exc):
+    """True for a PermissionError, or a yt-dlp error raised while handling one."""
+    cause = (getattr(exc, 'exc_info', None) or (None, None))[1]
+    return isinstance(exc, PermissionError) or isinstance(cause, PermissionError)
+
+
+def _format_rank(f):
+    """Sort key for the quality menu: resolution, fps, then prefer H.264."""
+    return (f.get('height') or 0, f.get('fps') or 0,
+            (f.get('vcodec') or '').startswith('avc1'), f.get('tbr') or 0)
+
+
 # ============ Android SAF Helper ============
 class AndroidSAF:
     def __init__(self, uri_str: str):
-        from jnius import autoclass
-        self.Uri = autoclass('android.net.Uri')
-        self.DocumentsContract = autoclass('android.provider.DocumentsContract')
-        self.ContentResolver = autoclass('android.content.ContentResolver')
-        self.PythonActivity = autoclass('org.kivy.android.PythonActivity')
-        self.uri = self.Uri.parse(uri_str)
-        self.cr = self.PythonActivity.mActivity.getContentResolver()
+        tree_uri = Uri.parse(uri_str)
+        tree_id = DocumentsContract.getTreeDocumentId(tree_uri)
+        # createDocument() wants the tree's root document, not the tree URI
+        self.uri = DocumentsContract.buildDocumentUriUsingTree(tree_uri, tree_id)
+        self.cr = content_resolver()
+        # A folder on primary storage ("primary:Movies/Clips") is often
+        # writable as a plain path too, which lets yt-dlp write in place
+        volume, _, rel = tree_id.partition(":")
+        self._fs_candidate = os.path.join(PRIMARY_STORAGE, rel) if volume == "primary" else None
+        self._fs_checked = False
+        self.fs_path = None
+
+    def writable_path(self):
+        """The tree's filesystem path if it is writable, else None.
+
+        Checked on first call, from a download worker: it is a FUSE stat.
+        """
+        if not self._fs_checked:
+            self._fs_checked = True
+            path = self._fs_candidate
+            if path and os.access(path, os.W_OK):
+                self.fs_path = path
+        return self.fs_path
 
     def create_file(self, display_name: str, mime: str = "video/mp4"):
         try:
-            return self.DocumentsContract.createDocument(self.cr, self.uri, mime, display_name)
+            return DocumentsContract.createDocument(self.cr, self.uri, mime, display_name)
         except:
             return None
 
     def open_output_stream(self, file_uri):
         return self.cr.openOutputStream(file_uri)
 
+    def open_fd(self, file_uri):
+        """Raw, caller-owned file descriptor for writing to file_uri."""
+        fd = self.cr.openFileDescriptor(file_uri, "w").detachFd()
+        if stat.S_ISFIFO(os.fstat(fd).st_mode):
+            # Some providers hand back a pipe; grow it from the 64 KiB default
+            # so each 1 MiB write isn't split into many provider round-trips
+            try:
+                fcntl.fcntl(fd, getattr(fcntl, "F_SETPIPE_SZ", 1031), 1024 * 1024)
+            except OSError:
+                pass
+        return fd
+
+
+# ============ Persistence ============
+class AtomicJsonStore(JsonStore):
+    """JsonStore that writes compact JSON to a temp file and swaps it in."""
+
+    def store_sync(self):
+        if self._is_changed is False:
+            return
+        tmp = self.filename + ".tmp"
+        with open(tmp, "w") as fd:
+            json.dump(self._data, fd, separators=(",", ":"))
+        os.replace(tmp, self.filename)
+        self._is_changed = False
+
 
 # ============ Main App ============
 class YouTubeDownloaderApp(MDApp):
@@ -186,107 +180,168 @@ class YouTubeDownloaderApp(MDApp):
     _default_path = None
     _formats = []
     _selected_format = None
+    _active_downloads = 0
+    _failed_downloads = 0  # in the current batch
+    _probe_future = None
+    _stopping = False
+    # Bumped on every change / set once that version is on disk
+    _recent_version = 0
+    _recent_saved = 0
+    _recent_flush_ev = None
     quality_menu = None
+    _dialog = None
+    _menu_open_scheduled = False
     DEFAULT_FOLDER_NAME = "YouTube Downloads"
+    RECENT_LIMIT = 10  # entries shown, kept in memory and persisted
+    INFO_CACHE_TTL = 300  # seconds an extract_info result is reused for
+    INFO_CACHE_SIZE = 8  # raw info dicts kept; each can be several MB
+    # Options shared by every yt-dlp call; per-call keys are layered on top
+    _BASE_YDL_OPTS = {
+        'quiet': True,
+        'no_warnings': True,
+        'noplaylist': True,
+        # Fetch DASH/HLS fragments in parallel instead of one by one
+        'concurrent_fragment_downloads': 8,
+        'http_chunk_size': 10 * 1024 * 1024,
+        'retries': 10,
+        'fragment_retries': 10,
+        # Adaptive formats come from the player response, so the DASH
+        # manifest is an extra request that adds nothing we offer. HLS is
+        # kept: live streams (and some clients' formats) exist only there.
+        # The auto-translated caption list (100+ languages) is never used.
+        'extractor_args': {'youtube': {'skip': ['dash', 'translated_subs']}},
+    }
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.store = JsonStore("ytdl_store.json")
+        # Bounded pool for the blocking yt-dlp work instead of a fresh
+        # thread per click
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ytdl")
+        # Every store write goes through this one thread: it never queues
+        # behind downloads and writes can't interleave
+        self._store_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ytdl-store")
+        self._url_progress = {}
+        self._info_cache = {}  # url -> (monotonic time, info dict)
+        self._info_lock = threading.Lock()
+        self._probe_ydl = None
+        # Persistent so yt-dlp's player-JS / signature cache survives restarts.
+        # Resolved once: App.user_data_dir stats (and may mkdir) on every access
+        self._ydl_cachedir = os.path.join(self.user_data_dir, "yt-dlp-cache")
+        self._probe_lock = threading.Lock()
+        # Worker threads only record state and fire this trigger; it applies
+        # the latest status/progress on the UI thread at most 5 times a second
+        self._ui_trigger = Clock.create_trigger(self._refresh_ui, 0.2)
+        self._pending_status = None
+        self.store = AtomicJsonStore("ytdl_store.json")
         if self.store.exists("recent"):
-            self.recent = self.store.get("recent")["items"][-20:]  # limit
+            self.recent = self.store.get("recent")["items"][-self.RECENT_LIMIT:]
         if self.store.exists("folder_uri"):
             data = self.store.get("folder_uri")
             self._folder_uri = data["uri"]
             self.download_folder = data["name"]
 
-        if platform == 'android':
+        # open_file_manager (bound from KV) is picked once per platform
+        if IS_ANDROID:
             self._setup_android_default()
             if self._folder_uri:
                 self._saf = AndroidSAF(self._folder_uri)
+            self.open_file_manager = self._android_folder_picker
+            # Registered once for the app's lifetime, not per picker click
+            android_activity.bind(on_activity_result=self._on_activity_result)
         else:
             self._setup_desktop_default()
+            self.open_file_manager = self._desktop_file_manager
 
     def _setup_android_default(self):
-        base = "/storage/emulated/0/Download"
+        base = os.path.join(PRIMARY_STORAGE, "Download")
         self._default_path = os.path.join(base, self.DEFAULT_FOLDER_NAME)
-        os.makedirs(self._default_path, exist_ok=True)
         if not self.download_folder:
             self.download_folder = self._default_path
 
     def _setup_desktop_default(self):
         path = os.path.join(os.path.expanduser("~"), self.DEFAULT_FOLDER_NAME)
-        os.makedirs(path, exist_ok=True)
         if not self.download_folder:
             self.download_folder = path
 
     def build(self):
         self.theme_cls.primary_palette = "Red"
         self.theme_cls.theme_style = "Light"
-        self.root = Builder.load_string(KV)
+        self.root = Builder.load_file(KV_FILE)
         Clock.schedule_once(self._post_build_init, 0)
         return self.root
 
+    def on_start(self):
+        # yt_dlp pulls in ~1800 extractor modules; import it on a worker
+        # after the first frame instead of before the window appears. A
+        # failure here is not lost: the next import raises it again in
+        # the probe/download paths, which report it in a dialog
+        self._pool.submit(importlib.import_module, "yt_dlp")
+
+    def on_stop(self):
+        # Pool workers are joined at interpreter exit; running downloads
+        # abort at their next progress callback instead of finishing
+        self._stopping = True
+        if self._recent_flush_ev:
+            self._recent_flush_ev.cancel()
+        # Let queued writes land, then write whatever they did not cover
+        self._store_writer.shutdown(wait=True)
+        self._flush_recent(background=False)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._probe_ydl:
+            self._probe_ydl.close()
+
     def _post_build_init(self, dt):
         self.root.ids.folder_label.text = self.download_folder
-        self.root.ids.percent_label.text = "0 %"
+        # Written on every progress tick; skip the ids lookup each time
+        self._percent_label = self.root.ids.percent_label
+        self._percent_label.text = "0 %"
+        # Built once; Load Formats only swaps its items
+        self.quality_menu = MDDropdownMenu(
+            caller=self.root.ids.quality_btn,
+            items=[],
+            width_mult=4,
+            max_height=dp(400),
+        )
         self._populate_recent()
 
     def _populate_recent(self):
-        lst = self.root.ids.recent_list
-        lst.clear_widgets()
-        for item in reversed(self.recent[-10:]):
-            lst.add_widget(OneLineListItem(text=f"{item['title']} — {item['time']}"))
+        # RecycleView reuses its row widgets; only the data list changes
+        self.root.ids.recent_list.data = [self._recent_row(item) for item in reversed(self.recent)]
 
-    # ==================== Folder Picker ====================
-    def open_file_manager(self):
-        if platform == 'android':
-            self._android_folder_picker()
-        else:
-            self._desktop_file_manager()
+    def _append_recent(self, item):
+        data = self.root.ids.recent_list.data
+        data.insert(0, self._recent_row(item))
+        if len(data) > self.RECENT_LIMIT:
+            data.pop()
+
+    @staticmethod
+    def _recent_row(item):
+        return {"text": f"{item['title']} — {item['time']}"}
 
+    # ==================== Folder Picker ====================
     def _android_folder_picker(self):
         try:
-            from jnius import autoclass
-            from android.runnable import run_on_ui_thread
-
-            Intent = autoclass('android.content.Intent')
-            PythonActivity = autoclass('org.kivy.android.PythonActivity')
-
-            @run_on_ui_thread
-            def start():
-                i = Intent(Intent.ACTION_OPEN_DOCUMENT_TREE)
-                i.addFlags(Intent.FLAG_GRANT_PERSISTABLE_URI_PERMISSION |
-                           Intent.FLAG_GRANT_READ_URI_PERMISSION |
-                           Intent.FLAG_GRANT_WRITE_URI_PERMISSION)
-                PythonActivity.mActivity.startActivityForResult(i, 1001)
-            start()
-
-            if not hasattr(PythonActivity.mActivity, 'ytdl_result_listener'):
-                PythonActivity.mActivity.ytdl_result_listener = True
-
-                def on_activity_result(request_code, result_code, data):
-                    if request_code == 1001 and result_code == -1 and data:
-                        self._handle_android_folder_result(data)
-                PythonActivity.mActivity.setResultListener(on_activity_result)
+            start_folder_picker()
         except Exception as e:
             self._show_dialog(f"Picker error: {e}")
 
+    def _on_activity_result(self, request_code, result_code, data):
+        # Called on the Android UI thread
+        if request_code == PICK_FOLDER_REQUEST and result_code == -1 and data:
+            self._handle_android_folder_result(data)
+
+    @mainthread
     def _handle_android_folder_result(self, intent):
         try:
-            from jnius import autoclass
-            Uri = autoclass('android.net.Uri')
-            DocumentFile = autoclass('android.provider.DocumentsContract$DocumentFile')
-            PythonActivity = autoclass('org.kivy.android.PythonActivity')
-
             uri = intent.getData()
-            cr = PythonActivity.mActivity.getContentResolver()
-            cr.takePersistableUriPermission(uri, 3)  # READ|WRITE
+            content_resolver().takePersistableUriPermission(uri, 3)  # READ|WRITE
 
-            doc = DocumentFile.fromTreeUri(PythonActivity.mActivity, uri)
-            name = doc.getName() or "Selected Folder"
+            # Tree document ids look like "primary:Download/Videos"
+            doc_id = DocumentsContract.getTreeDocumentId(uri)
+            name = doc_id.rpartition(":")[2].rpartition("/")[2] or "Selected Folder"
 
             self._folder_uri = uri.toString()
-            self.store.put("folder_uri", uri=self._folder_uri, name=name)
+            self._store_writer.submit(self.store.put, "folder_uri", uri=self._folder_uri, name=name)
             self.download_folder = name
             self.root.ids.folder_label.text = name
             self._saf = AndroidSAF(self._folder_uri)
@@ -296,6 +351,8 @@ class YouTubeDownloaderApp(MDApp):
 
     def _desktop_file_manager(self):
         if not hasattr(self, "file_manager") or not self.file_manager:
+            # Desktop-only and built on first use, so not imported at startup
+            from kivymd.uix.filemanager import MDFileManager
             self.file_manager = MDFileManager(
                 exit_manager=lambda x: self.file_manager.close(),
                 select_path=self._select_desktop_path,
@@ -311,95 +368,118 @@ class YouTubeDownloaderApp(MDApp):
     def clear_inputs(self):
         self.root.ids.url_field.text = ""
         self.progress = 0
-        self.status_text = "Ready"
-        self.root.ids.percent_label.text = "0 %"
+        self._set_status("Ready")
+        self._percent_label.text = "0 %"
         self._reset_quality_selector()
 
     # ==================== Load Formats (FIXED) ====================
     def load_formats(self):
-        url = self.root.ids.url_field.text.strip()
+        # Formats are listed for the first URL of a batch
+        url = next(iter(self.root.ids.url_field.text.split()), "")
         if not url:
             return self._show_dialog("Please enter a YouTube URL")
+        if not _YT_URL_RE.match(url):
+            return self._show_dialog(f"Not a YouTube video URL:\n{url}")
+        if self._probe_future and not self._probe_future.done():
+            return  # double tap: a probe is already running
         self._set_status("Loading formats...")
-        threading.Thread(target=self._load_formats_thread, args=(url,), daemon=True).start()
+        self._probe_future = self._pool.submit(self._load_formats_thread, url)
 
     def _load_formats_thread(self, raw_url):
         url = fix_shorts_url(raw_url)
         try:
-            ydl = yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True})
-            info = ydl.extract_info(url, download=False)
-            formats = info.get('formats', [])
-
-            self._formats = []
+            # Inside the try: a broken install must reach the dialog below
+            import yt_dlp
+            with self._probe_lock:
+                if self._probe_ydl is None:
+                    # Probing always uses the same options, so one instance
+                    # serves every Load Formats for the app's lifetime
+                    self._probe_ydl = yt_dlp.YoutubeDL({
+                        **self._BASE_YDL_OPTS,
+                        'cachedir': self._ydl_cachedir,
+                    })
+                # The raw extractor result already lists every format; skip
+                # yt-dlp's format selection / sorting / thumbnail processing
+                info = self._probe_ydl.extract_info(url, download=False, process=False)
+                # Only the raw result is cached; see _resolve
+                self._cache_info(url, info)
+                if 'formats' not in info:
+                    # Redirect or playlist wrapper: let yt-dlp resolve it
+                    info = self._probe_ydl.process_ie_result(copy.deepcopy(info), download=False)
+
+            formats = []
             seen = set()
-
-            for f in formats:
-                if f.get('vcodec') == 'none' or (f.get('acodec') == 'none' and f.get('height') is None):
+            append, mark = formats.append, seen.add
+            for f in sorted(info.get('formats', []), key=_format_rank, reverse=True):
+                get = f.get
+                height = get('height')
+                if not height or get('vcodec') == 'none':
                     continue
-                height = f.get('height')
-                if not height:
+                fps = get('fps') or 0
+                if fps <= 30:
+                    fps = 0  # not shown in the label, so not a distinct entry
+                ext = get('ext', 'mp4')
+                # Dedup on the cheap tuple; only unique entries get a label
+                key = (height, fps, ext)
+                if key in seen:
                     continue
-                ext = f.get('ext', 'mp4')
-                fps = f.get('fps') or 0
-                fps_str = f" ({fps}fps)" if fps > 30 else ""
+                mark(key)
+                fps_str = f" ({fps}fps)" if fps else ""
                 label = f"{height}p{fps_str} • {ext.upper()}"
-                if label in seen:
-                    continue
-                seen.add(label)
-                self._formats.append({
+                append({
                     "format_id": f["format_id"],
                     "text": label,
-                    "height": height
+                    "height": height,
+                    "has_audio": get('acodec') != 'none',
                 })
 
-            self._formats.sort(key=lambda x: x["height"], reverse=True)
-            Clock.schedule_once(self._show_quality_menu)
+            self._formats = formats
+            # Built here so the UI thread only has to hand them to the menu
+            menu_items = [
+                {
+                    "text": f["text"],
+                    "viewclass": "OneLineListItem",
+                    "height": dp(56),
+                    "on_release": partial(self._select_quality, f["format_id"], f["text"]),
+                }
+                for f in formats
+            ]
+            self._show_quality_menu(menu_items)
         except Exception as e:
-            Clock.schedule_once(lambda dt: self._show_dialog(f"Error loading formats:\n{e}"))
+            self._show_dialog(f"Error loading formats:\n{e}")
 
     @mainthread
-    def _show_quality_menu(self, dt):
+    def _show_quality_menu(self, menu_items):
         
-        if not self._formats:
+        if not menu_items:
             self._show_dialog("No video formats found")
             self._set_status("Ready")
             return
         
-        if self.quality_menu:
-            self.quality_menu.dismiss()
-        
-        menu_items = [
-        {
-            "text": f["text"],
-            "viewclass": "OneLineListItem",
-            "height": dp(56),
-            "on_release": lambda x=f["format_id"], y=f["text"]: self._select_quality(x, y),
-        }
-        for f in self._formats
-        ]
-        
-        self.quality_menu = MDDropdownMenu(
-        caller=self.root.ids.quality_btn,
-        items=menu_items,
-        width_mult=4,
-        max_height=dp(400),
-        )
+        self.quality_menu.dismiss()
+        self.quality_menu.items = menu_items
         
         self.root.ids.quality_btn.disabled = False
-        self.root.ids.quality_btn.text = f"{len(self._formats)} qualities ↓"
+        self.root.ids.quality_btn.text = f"{len(menu_items)} qualities ↓"
         self._set_status("Tap Quality button ↓")
         
-        def try_open(dt):
-            btn = self.root.ids.quality_btn
-            if btn.get_parent_window() and btn.collide_point(*btn.center):
-                try:
-                    self.quality_menu.open()
-                except:
-                    Clock.schedule_once(try_open, 0.2)
-            else:
-                Clock.schedule_once(try_open, 0.2)
-            
-            Clock.schedule_once(try_open, 0.3)
+        # At most one pending attempt; stop as soon as the menu is up.
+        if not self._menu_open_scheduled:
+            self._menu_open_scheduled = True
+            Clock.schedule_once(partial(self._try_open_quality_menu, 10), 0.3)
+
+    def _try_open_quality_menu(self, tries, dt):
+        if self.root.ids.quality_btn.get_parent_window():
+            try:
+                self.quality_menu.open()
+                self._menu_open_scheduled = False
+                return
+            except Exception:
+                pass
+        if tries > 1:
+            Clock.schedule_once(partial(self._try_open_quality_menu, tries - 1), 0.2)
+        else:
+            self._menu_open_scheduled = False
 
     def _select_quality(self, fmt_id, text):
         self._selected_format = fmt_id
@@ -414,112 +494,368 @@ class YouTubeDownloaderApp(MDApp):
         self._formats = []
         if self.quality_menu:
             self.quality_menu.dismiss()
-            self.quality_menu = None
+            self.quality_menu.items = []
 
     # ==================== Download ====================
     def start_download(self):
-        url = self.root.ids.url_field.text.strip()
-        if not url or not self._selected_format:
+        # Several URLs may be pasted at once (newline/space separated); they
+        # are downloaded concurrently on the pool with the same quality
+        urls = self.root.ids.url_field.text.split()
+        if not urls or not self._selected_format:
             return self._show_dialog("URL and quality required")
-        threading.Thread(target=self._download_thread, args=(url,), daemon=True).start()
-
-    def _download_thread(self, raw_url):
-        self.progress = 0
+        bad = [u for u in urls if not _YT_URL_RE.match(u)]
+        if bad:
+            return self._show_dialog("Not a YouTube video URL:\n" + "\n".join(bad))
+        # Ignore URLs that are still downloading (double tap)
+        urls = [u for u in dict.fromkeys(urls) if u not in self._url_progress]
+        if not urls:
+            return
+        # Taken now: queued jobs may start after Clear or another Load Formats
+        fmt_spec = self._format_spec()
+        self._url_progress.update(dict.fromkeys(urls, 0))
+        self._active_downloads += len(urls)
         self._set_status("Preparing...")
-        url = fix_shorts_url(raw_url)
-
-        ydl_opts = {
-            'format': self._selected_format,
-            'noplaylist': True,
-            'progress_hooks': [self._progress_hook],
-            'quiet': True,
-            'no_warnings': True,
-            'merge_output_format': 'mp4',
-        }
+        for url in urls:
+            self._pool.submit(self._download_thread, url, fmt_spec)
 
-        if platform == 'android' and self._saf:
-            # SAF download
-            info = yt_dlp.YoutubeDL({'quiet': True}).extract_info(url, download=False)
-            title = info.get('title', 'video')
-            safe_name = re.sub(r'[<>:"/\\|?*]', '_', title)[:100]
-            filename = f"{safe_name}.mp4"
+    def _download_thread(self, raw_url, fmt_spec):
+        ok = False
+        try:
+            ok = self._download(raw_url, fmt_spec)
+        finally:
+            self._download_done(raw_url, ok)
 
-            file_uri = self._saf.create_file(filename)
-            if not file_uri:
-                self._set_status("Failed to create file in SAF")
-                return
+    def _download(self, raw_url, fmt_spec):
+        saf = self._saf if IS_ANDROID else None
+        try:
+            url = fix_shorts_url(raw_url)
+            hook = partial(self._progress_hook, raw_url)
+            ydl_opts = {
+                **self._BASE_YDL_OPTS,
+                'format': fmt_spec,
+                'progress_hooks': [hook],
+                'cachedir': self._ydl_cachedir,
+            }
+            if '+' in fmt_spec:
+                # Only a video+audio merge needs ffmpeg; progressive formats
+                # are saved as-is instead of being remuxed
+                ydl_opts['merge_output_format'] = 'mp4'
+
+            fs_path = saf and saf.writable_path()
+            if fs_path:
+                try:
+                    self._download_to_path(ydl_opts, url, fs_path)
+                    return True
+                except Exception as e:
+                    if not _permission_denied(e):
+                        raise
+                    # The path looked writable but isn't; use SAF from now on
+                    saf.fs_path = None
+            if saf:
+                self._download_to_saf(ydl_opts, url, hook)
+            else:
+                folder = self._default_path if IS_ANDROID else self.download_folder
+                self._download_to_path(ydl_opts, url, folder)
+            return True
+        except Exception as e:
+            self._show_dialog(f"Download failed: {e}")
+            return False
 
-            tmp_opts = ydl_opts.copy()
-            tmp_opts['outtmpl'] = '/data/data/org.test.ytdl/cache_%(id)s.%(ext)s'
-
-            def saf_progress(d):
-                if d['status'] == 'finished':
-                    tmp_path = d['filename']
-                    try:
-                        with open(tmp_path, 'rb') as src:
-                            with self._saf.open_output_stream(file_uri) as dst:
-                                while True:
-                                    chunk = src.read(1024 * 1024)
-                                    if not chunk:
-                                        break
-                                    dst.write(chunk)
-                        os.unlink(tmp_path)
-                    except Exception as e:
-                        self._show_dialog(f"SAF write error: {e}")
-                self._progress_hook(d)
-
-            tmp_opts['progress_hooks'] = [saf_progress]
-            self._set_status(f"Downloading: {title}")
-            try:
-                yt_dlp.YoutubeDL(tmp_opts).download([url])
-                self._record_recent(title)
-            except Exception as e:
-                self._show_dialog(f"Download failed: {e}")
+    def _download_to_path(self, ydl_opts, url, folder):
+        # SAF folder reachable by path, Android fallback, or Desktop
+        import yt_dlp
+        # Every file yt-dlp writes, so a failed job leaves nothing behind
+        written = set()
 
-        else:
-            # Normal download (Android fallback or Desktop)
-            folder = self._default_path if platform == 'android' else self.download_folder
-            ydl_opts['outtmpl'] = os.path.join(folder, '%(title)s.%(ext)s')
-            try:
-                info = yt_dlp.YoutubeDL(ydl_opts).download([url])
-                title = info.get('title') if isinstance(info, dict) else 'Unknown'
-                self._record_recent(title)
-            except Exception as e:
-                self._show_dialog(f"Download error: {e}")
+        def record(d):
+            written.update(filter(None, (d.get('filename'), d.get('tmpfilename'))))
 
-        self._set_status("Download finished!")
-        self.progress = 100
-        self.root.ids.percent_label.text = "100 %"
+        ydl_opts = {
+            **ydl_opts,
+            'outtmpl': os.path.join(folder, '%(title)s.%(ext)s'),
+            # First, so a file is recorded even if a later hook aborts
+            'progress_hooks': [record, *ydl_opts['progress_hooks']],
+        }
+        if IS_ANDROID:
+            # Media-only folders (e.g. Movies) reject ".part" names
+            ydl_opts['nopart'] = True
+        # Created on first use rather than at startup (slow FUSE stat on Android)
+        if not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+        try:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = self._resolve(ydl, url, download=True)
+        except BaseException:
+            # With nopart a half-written stream (e.g. the video half of a
+            # merge) would stay in the user's folder, and a SAF retry would
+            # then save a second copy next to it
+            for path in written:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            raise
+        title = info.get('title') if isinstance(info, dict) else 'Unknown'
+        self._record_recent(title)
+
+    def _download_to_saf(self, ydl_opts, url, hook):
+        # Progressive formats are streamed straight into the document;
+        # merged ones need ffmpeg and a seekable local file, so they go
+        # through a private temp dir and get copied.
+        import yt_dlp
+        tmp_dir = tempfile.mkdtemp()
+        ydl_opts = {**ydl_opts, 'outtmpl': os.path.join(tmp_dir, '%(id)s.%(ext)s')}
+        self._set_status("Downloading...")
+        try:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = self._resolve(ydl, url)
+                title = info.get('title', 'video')
+                safe_name = title.translate(_UNSAFE_CHARS)[:100]
+                ext = info.get('ext', 'mp4')
+                filename = f"{safe_name}.{ext}"
+
+                file_uri = self._saf.create_file(
+                    filename, _MIME_TYPES.get(ext, "application/octet-stream"))
+                if not file_uri:
+                    raise OSError(f"Could not create {filename} in {self.download_folder}")
+                if 'requested_formats' not in info and info.get('protocol') in ('http', 'https'):
+                    self._stream_to_saf(ydl, info, file_uri, hook)
+                else:
+                    info = self._resolve(ydl, url, download=True)
+                    # The bar already reads 100 % here; say what the wait is
+                    self._set_status(f"Saving to {self.download_folder}...")
+                    self._copy_to_saf(info['requested_downloads'][0]['filepath'], file_uri)
+            self._record_recent(title)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
 
     @mainthread
-    def _progress_hook(self, d):
+    def _download_done(self, raw_url, ok):
+        self._active_downloads -= 1
+        if not ok:
+            self._failed_downloads += 1
+        if not self._active_downloads:
+            self._url_progress = {}
+            failed, self._failed_downloads = self._failed_downloads, 0
+            if failed:
+                # Each failure already showed its own dialog
+                self._set_status(f"{failed} download(s) failed")
+                return
+            self._set_status("Download finished!")
+            self.progress = 100
+            self._percent_label.text = "100 %"
+
+    def _format_spec(self):
+        fmt_id = self._selected_format
+        fmt = next((f for f in self._formats if f["format_id"] == fmt_id), None)
+        if not fmt:
+            return fmt_id
+        # The itag comes from the probed (first) URL; other videos in a
+        # batch may not offer it, so fall back to the same height
+        height = fmt["height"]
+        if HAS_FFMPEG:
+            spec = f"{fmt_id}/bv*[height<={height}]+ba/b[height<={height}]"
+            if not fmt["has_audio"]:
+                # Video-only stream: pair it with the best audio
+                spec = f"{fmt_id}+bestaudio/" + spec
+            return spec
+        return f"{fmt_id}/b[height<={height}]"
+
+    def _resolve(self, ydl, url, download=False):
+        hit = self._info_cache.get(url)
+        if hit and time.monotonic() - hit[0] < self.INFO_CACHE_TTL:
+            # Reuse a recent extraction (e.g. from Load Formats) instead of
+            # hitting YouTube again for the same video
+            raw = hit[1]
+        else:
+            raw = ydl.extract_info(url, download=False, process=False)
+            self._cache_info(url, raw)
+        # Format selection writes into the dict (requested_formats, url, ...)
+        # and a later pass never clears those keys, so every call processes
+        # its own copy of the unprocessed extractor result
+        return ydl.process_ie_result(copy.deepcopy(raw), download=download)
+
+    def _cache_info(self, url, raw):
+        now = time.monotonic()
+        with self._info_lock:  # probe and download workers insert concurrently
+            cache = self._info_cache
+            for key in [k for k, (t, _) in cache.items() if now - t >= self.INFO_CACHE_TTL]:
+                del cache[key]
+            cache.pop(url, None)
+            cache[url] = (now, raw)
+            # Insertion order is age order, so the oldest entry goes first
+            while len(cache) > self.INFO_CACHE_SIZE:
+                del cache[next(iter(cache))]
+
+    def _stream_to_saf(self, ydl, info, file_uri, hook):
+        """Download a single progressive format directly into file_uri."""
+        from yt_dlp.networking import Request
+        headers = info.get('http_headers') or {}
+        # YouTube throttles open-ended requests, so fetch in ranged chunks
+        # the same way yt-dlp's own HTTP downloader does
+        chunk_size = (info.get('downloader_options') or {}).get('http_chunk_size') or 10 * 1024 * 1024
+        # Only an exact size may bound the loop; filesize_approx is just for
+        # the progress bar and can be lower than the real size
+        size = info.get('filesize')
+        estimate = size or info.get('filesize_approx')
+        downloaded = 0
+        dst_fd = self._saf.open_fd(file_uri)
+        try:
+            while size is None or downloaded < size:
+                end = downloaded + chunk_size - 1
+                req = Request(info['url'], headers={**headers, 'Range': f'bytes={downloaded}-{end}'})
+                got = 0
+                with ydl.urlopen(req) as resp:
+                    ranged = resp.status == 206
+                    if not ranged and downloaded:
+                        # A full body now would be appended to what we have
+                        raise OSError("Server stopped honouring Range requests")
+                    if ranged and size is None:
+                        # "bytes 0-1048575/52428800": the part after "/" is exact
+                        total = resp.headers.get('Content-Range', '').rpartition('/')[2]
+                        if total.isdigit():
+                            size = estimate = int(total)
+                    while True:
+                        chunk = resp.read(COPY_BUFSIZE)
+                        if not chunk:
+                            break
+                        view = memoryview(chunk)
+                        while view:
+                            view = view[os.write(dst_fd, view):]
+                        got += len(chunk)
+                        downloaded += len(chunk)
+                        hook({'status': 'downloading',
+                              'downloaded_bytes': downloaded,
+                              'total_bytes': size,
+                              'total_bytes_estimate': estimate})
+                # Without a known size, a short chunk means EOF; with one, a
+                # short chunk is just resumed by the next ranged request
+                if not ranged or not got or (size is None and got < chunk_size):
+                    break
+        finally:
+            os.close(dst_fd)
+        if size is not None and downloaded < size:
+            raise OSError(f"Download cut short at {downloaded} of {size} bytes")
+        hook({'status': 'finished'})
+
+    def _copy_to_saf(self, src_path, file_uri):
+        dst_fd = self._saf.open_fd(file_uri)
+        try:
+            with open(src_path, 'rb') as src:
+                src_fd = src.fileno()
+                size = os.fstat(src_fd).st_size
+                offset = 0
+                try:
+                    # In-kernel copy, no bytes pass through Python
+                    while offset < size:
+                        sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                        if not sent:
+                            break
+                        offset += sent
+                except OSError as e:
+                    if e.errno not in (errno.EINVAL, errno.ENOSYS):
+                        raise
+                    # Pipe-backed providers can't sendfile; copy the rest by hand
+                    src.seek(offset)
+                    # One reusable buffer instead of a new bytes object per read
+                    buf = memoryview(bytearray(COPY_BUFSIZE))
+                    while True:
+                        n = src.readinto(buf)
+                        if not n:
+                            break
+                        view = buf[:n]
+                        while view:
+                            view = view[os.write(dst_fd, view):]
+        finally:
+            os.close(dst_fd)
+
+    def _progress_hook(self, raw_url, d):
+        # Called by yt-dlp on the worker thread for every chunk; only the
+        # latest percent per URL is kept for the next _refresh_ui
+        if self._stopping:
+            from yt_dlp.utils import DownloadCancelled
+            raise DownloadCancelled("App is closing")
         if d['status'] == 'downloading':
-            total = d.get('total_bytes') or d.get('total_bytes_estimate') or 1
-            downloaded = d.get('downloaded_bytes', 0)
-            percent = int(downloaded / total * 100)
-            self.progress = percent
-            self.root.ids.percent_label.text = f"{percent} %"
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            if not total:
+                return  # size unknown: keep the bar where it is
+            # An estimate can undershoot; 100 is only shown once finished
+            percent = min(int(d.get('downloaded_bytes', 0) * 100 / total), 99)
         elif d['status'] == 'finished':
-            self.progress = 100
-            self.root.ids.percent_label.text = "100 %"
+            percent = 100
+        else:
+            return
+        progress = self._url_progress
+        if raw_url not in progress or progress[raw_url] == percent:
+            return
+        progress[raw_url] = percent
+        self._ui_trigger()
+
+    def _refresh_ui(self, dt):
+        # _pending_status is never cleared (a worker could be writing it);
+        # applying it is simply skipped when nothing changed
+        status = self._pending_status
+        if status is not None and status != self.status_text:
+            self.status_text = status
+        if not self._url_progress:
+            return
+        # Overall progress is the average over every URL in the batch
+        percent = sum(self._url_progress.values()) // len(self._url_progress)
+        if percent != self.progress:
+            self.progress = percent
+            self._percent_label.text = f"{percent} %"
 
-    @mainthread
     def _set_status(self, txt):
-        self.status_text = txt
+        # Safe from any thread; shown with the next _refresh_ui
+        if txt == self._pending_status:
+            return
+        self._pending_status = txt
+        self._ui_trigger()
 
+    @mainthread
     def _record_recent(self, title):
         now = datetime.datetime.now().strftime("%b %d, %H:%M")
         item = {"title": title[:50] + ("..." if len(title) > 50 else ""), "time": now}
-        self.recent.append(item)
-        if len(self.recent) > 50:
-            self.recent = self.recent[-50:]
-        self.store.put("recent", items=self.recent)
-        Clock.schedule_once(lambda dt: self._populate_recent())
+        recent = self.recent
+        recent.append(item)
+        if len(recent) > self.RECENT_LIMIT:
+            del recent[0]
+        # self.recent is the source of truth; coalesce disk writes so a
+        # batch of downloads only serializes the list once
+        self._recent_version += 1
+        if not self._recent_flush_ev:
+            self._recent_flush_ev = Clock.schedule_once(self._flush_recent, 2.0)
+        self._append_recent(item)
+
+    def _flush_recent(self, dt=None, background=True):
+        self._recent_flush_ev = None
+        version = self._recent_version
+        if version == self._recent_saved:
+            return
+        items = list(self.recent)
+        if background:
+            self._store_writer.submit(self._write_recent, items, version)
+        else:
+            self._write_recent(items, version)
+
+    def _write_recent(self, items, version):
+        self.store.put("recent", items=items)
+        # Only now is it safe for on_stop to skip this version
+        self._recent_saved = max(self._recent_saved, version)
 
+    @mainthread
     def _show_dialog(self, text):
         if "\n" in text and len(text) > 200:
             text = text[:197] + "..."
-        MDDialog(title="Notice", text=text, size_hint=(0.85, None), auto_dismiss=True).open()
+        # One dialog for the app's lifetime; a second notice while it is
+        # still open just replaces the text
+        if not self._dialog:
+            # Only needed once something goes wrong; imported on first use
+            from kivymd.uix.dialog import MDDialog
+            self._dialog = MDDialog(title="Notice", text=text, size_hint=(0.85, None), auto_dismiss=True)
+        else:
+            self._dialog.text = text
+        self._dialog.open()
 
 
 if __name__ == '__main__':